@@ -5,24 +5,44 @@
 #   MODEL_ID                (e.g. meta.llama3-8b-instruct-v1:0)
 # Optional:
 #   AWS_REGION              (default: us-east-1)
+#   INFERENCE_PROFILE_ARN   (cross-region inference profile; overrides MODEL_ID for generation)
 #   LLAMA_TEMPERATURE       (default: 0.3)
 #   LLAMA_MAX_TOKENS        (default: 512)
 #   RETRIEVAL_TOP_K         (default: 6)
-
+#   BEDROCK_LATENCY         (standard | optimized, default: standard)
+#   CACHE_TABLE             (DynamoDB table, pk "cache_key", TTL attr "expires_at"; default: in-memory only)
+#   CACHE_TTL_SEC           (default: 86400)
+#   CACHE_MAX_ITEMS         (in-memory entries per container, default: 256)
+#   EMBED_MODEL_ID          (e.g. amazon.titan-embed-text-v2:0; enables semantic cache)
+#   CACHE_SIM_THRESHOLD     (default: 0.95)
+#   BEDROCK_STREAM          (1 = retrieve_and_generate_stream с ранней остановкой, default: 0)
+#   GENERATE_LANGS          (языки, которые модель пишет сама, без Translate; default: en,kk)
+
+import hashlib
+import itertools
 import json
+import math
 import os
 import re
 import time
-from typing import Any, Dict, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import boto3
 from botocore.config import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
+
+try:
+    import orjson
+except ImportError:  # локально без слоя с orjson
+    orjson = None
 
 # ---------- ENV ----------
 REGION = os.getenv("AWS_REGION", "us-east-1").strip()
 KB_ID = (os.getenv("KNOWLEDGE_BASE_ID") or "").strip()
 MODEL_ID = (os.getenv("MODEL_ID") or "meta.llama3-8b-instruct-v1:0").strip()
+INFERENCE_PROFILE_ARN = (os.getenv("INFERENCE_PROFILE_ARN") or "").strip()
 
 def _env_float(name: str, default: float) -> float:
     try:
@@ -39,25 +59,62 @@ def _env_int(name: str, default: int) -> int:
 BASE_TEMP = _env_float("LLAMA_TEMPERATURE", 0.3)
 MAX_TOKENS = _env_int("LLAMA_MAX_TOKENS", 512)
 TOP_K = _env_int("RETRIEVAL_TOP_K", 6)
+LATENCY_MODE = (os.getenv("BEDROCK_LATENCY") or "standard").strip().lower()
+STREAM = (os.getenv("BEDROCK_STREAM") or "0").strip() == "1"
+
+CACHE_TABLE = (os.getenv("CACHE_TABLE") or "").strip()
+CACHE_TTL_SEC = _env_int("CACHE_TTL_SEC", 86400)
+CACHE_MAX_ITEMS = _env_int("CACHE_MAX_ITEMS", 256)
+EMBED_MODEL_ID = (os.getenv("EMBED_MODEL_ID") or "").strip()
+CACHE_SIM_THRESHOLD = _env_float("CACHE_SIM_THRESHOLD", 0.95)
+GENERATE_LANGS = frozenset(
+    l.strip().lower() for l in (os.getenv("GENERATE_LANGS") or "en,kk").split(",") if l.strip()
+)
 
 if not KB_ID:
     raise RuntimeError("KNOWLEDGE_BASE_ID env var is not set")
 
 FOUNDATION_MODEL_ARN = f"arn:aws:bedrock:{REGION}::foundation-model/{MODEL_ID}"
+# Профиль маршрутизирует запросы по нескольким регионам: выше TPS, меньше throttling
+GENERATION_MODEL_ARN = INFERENCE_PROFILE_ARN or FOUNDATION_MODEL_ARN
 
 # ---------- CLIENTS ----------
+# Пул побольше + TCP keep-alive: warm-контейнер переиспользует соединения без повторного TLS
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+    connect_timeout=3,
+    read_timeout=30,
+)
+
 bedrock_agent_rt = boto3.client(
     "bedrock-agent-runtime",
     region_name=REGION,
-    config=Config(retries={"max_attempts": 3, "mode": "standard"}),
+    config=BOTO_CONFIG,
 )
 
 translate = boto3.client(
     "translate",
     region_name=REGION,
-    config=Config(retries={"max_attempts": 3, "mode": "standard"}),
+    config=BOTO_CONFIG,
 )
 
+dynamodb = boto3.client(
+    "dynamodb",
+    region_name=REGION,
+    config=BOTO_CONFIG,
+) if CACHE_TABLE else None
+
+bedrock_rt = boto3.client(
+    "bedrock-runtime",
+    region_name=REGION,
+    config=BOTO_CONFIG,
+) if EMBED_MODEL_ID else None
+
+# boto3 синхронный — параллелим независимые вызовы в потоках (пул живёт весь warm-контейнер)
+_executor = ThreadPoolExecutor(max_workers=4)
+
 # ---------- PROMPT TEMPLATE (исправлены плейсхолдеры: $query$ и $search_results$) ----------
 PROMPT_RU_TEMPLATE = """Ты — ассистент для туристов Астаны. Отвечай ТОЛЬКО по фактам из базы знаний.
 Соблюдай выбранный стиль общения (persona):
@@ -73,6 +130,7 @@ friendly → "Лид: В Астане вас ждут колоритные ба
 humorous → "Лид: Настроены на шопинг с казахским колоритом? Базары уже ждут! Факты: … Итог: Позвоните и загляните — кошелёк держите покрепче."
 
 Стиль общения (persona): {persona}
+{language_rule}
 
 Формат ответа (строго):
 Лид (1 строка): короткое описание темы.
@@ -93,21 +151,55 @@ humorous → "Лид: Настроены на шопинг с казахским
 $search_results$
 """
 
+PERSONAS = ("formal", "friendly", "humorous")
+LANGS = ("ru", "kk", "en")
+
+# Фрагменты базы на русском — инструкция остаётся русской, меняется только язык ответа
+LANGUAGE_RULES = {
+    "ru": "Язык ответа: русский.",
+    "kk": (
+        "Язык ответа: казахский (қазақ тілі). Пиши весь ответ ТОЛЬКО на казахском, "
+        "даже если фрагменты базы на русском. Метки разделов: Лид / Деректер / Қорытынды."
+    ),
+    "en": (
+        "Язык ответа: английский (English). Пиши весь ответ ТОЛЬКО на английском, "
+        "даже если фрагменты базы на русском. Метки разделов: Lead / Facts / Summary."
+    ),
+}
+
+PROMPT_BY_LANG_PERSONA = {
+    (l, p): PROMPT_RU_TEMPLATE.format(persona=p, language_rule=LANGUAGE_RULES[l])
+    for l in LANGS
+    for p in PERSONAS
+}
+
 # ---------- CLEANUP ----------
-NOISE_RE = re.compile(r"(?:</?SYS>|</?INST>|\[/?SYS]|\[/INST])", re.IGNORECASE)
+# Служебные токены модели и HTML-теги — одним проходом. Тег ищется так, будто токены уже
+# вырезаны: внутри <...> они пропускаются целиком (possessive, Python 3.11+).
+_NOISE = r"</?SYS>|</?INST>|\[/?SYS]|\[/INST]"
+TAGS_RE = re.compile(
+    rf"(?:{_NOISE})|<(?=(?:{_NOISE})*+[^>])(?:{_NOISE}|[^>])*+>",
+    re.IGNORECASE,
+)
 OUT_TAG_RE = re.compile(r"<out>(.*?)</out>", re.DOTALL | re.IGNORECASE)
-HTML_TAG_RE = re.compile(r"</?[^>]+>")
 DANGEROUS_SECTIONS_RE = re.compile(
     r"(?:^|\n)\s*(?:</out>|\*{0,2}\s*output\s*:|\*{0,2}\s*note\s*:|output\s*:|note\s*:).*$",
     re.IGNORECASE | re.DOTALL,
 )
+# Заголовки markdown в начале строки и лишние пустые строки — тоже один проход
+LAYOUT_RE = re.compile(r"(?P<heading>^[ \t]*#{1,6}\s*)|(?P<blank>\n{3,})", re.MULTILINE)
+MD_TABLE = str.maketrans({"|": " ", "*": None, "`": None})
+
+def _layout_sub(m: "re.Match[str]") -> str:
+    return "\n\n" if m.lastgroup == "blank" else ""
 
 def _clean_noise(text: str) -> str:
     if not text:
         return text
-    t = NOISE_RE.sub("", text)
-    t = HTML_TAG_RE.sub("", t)
-    return t.strip()
+    # Обычный ответ модели без тегов — regex не нужен
+    if "<" not in text and "[" not in text:
+        return text.strip()
+    return TAGS_RE.sub("", text).strip()
 
 def _extract_out(text: str) -> str:
     if not text:
@@ -124,54 +216,47 @@ def _strip_after_markers(text: str) -> str:
     return DANGEROUS_SECTIONS_RE.sub("", text).strip()
 
 def _strip_markdown_symbols(text: str) -> str:
-    t = text.replace("|", " ")
-    t = t.replace("**", "").replace("*", "")
-    t = t.replace("`", "")
-    t = re.sub(r"^[ \t]*#{1,6}\s*", "", t, flags=re.MULTILINE)
-    return t
+    return text.translate(MD_TABLE)
 
 def _final_sanitize(text: str) -> str:
     t = _extract_out(text)
     t = _strip_after_markers(t)
     t = _clean_noise(t)
     t = _strip_markdown_symbols(t)
-    t = re.sub(r"\n{3,}", "\n\n", t).strip()
-    return t
+    if "#" in t or "\n\n\n" in t:
+        t = LAYOUT_RE.sub(_layout_sub, t)
+    return t.strip()
 
 # ---------- Citations ----------
-def _extract_citations(rag_response: Dict[str, Any]) -> List[Dict[str, str]]:
-    cites: List[Dict[str, str]] = []
+MAX_CITATIONS = 8
+
+def _ref_to_cite(ref: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    loc = ref.get("location", {})
+    uri = loc.get("s3Location", {}).get("uri") or loc.get("webLocation", {}).get("url") or ""
+    if not uri:
+        return None
+    return {"uri": uri, "snippet": ref.get("content", {}).get("text", "")[:600]}
+
+def _iter_refs(rag_response: Dict[str, Any]) -> Iterator[Dict[str, str]]:
+    found = False
     for c in rag_response.get("citations", []):
-        for prov in c.get("generatedResponsePart", {}).get("citations", []):
-            for ref in prov.get("retrievedReferences", []):
-                uri = (
-                    ref.get("location", {}).get("s3Location", {}).get("uri")
-                    or ref.get("location", {}).get("webLocation", {}).get("url")
-                    or ""
-                )
-                frag = ref.get("content", {}).get("text", "")
-                if uri:
-                    cites.append({"uri": uri, "snippet": frag[:600]})
-        for ref in c.get("retrievedReferences", []):
-            uri = (
-                ref.get("location", {}).get("s3Location", {}).get("uri")
-                or ref.get("location", {}).get("webLocation", {}).get("url")
-                or ""
-            )
-            frag = ref.get("content", {}).get("text", "")
-            if uri:
-                cites.append({"uri": uri, "snippet": frag[:600]})
-    if not cites and "retrievedReferences" in rag_response:
+        parts = c.get("generatedResponsePart", {}).get("citations", [])
+        refs = itertools.chain.from_iterable(p.get("retrievedReferences", []) for p in parts)
+        for ref in itertools.chain(refs, c.get("retrievedReferences", [])):
+            cite = _ref_to_cite(ref)
+            if cite:
+                found = True
+                yield cite
+    # Верхнеуровневые retrievedReferences — только если в citations ничего не нашлось
+    if not found:
         for ref in rag_response.get("retrievedReferences", []):
-            uri = (
-                ref.get("location", {}).get("s3Location", {}).get("uri")
-                or ref.get("location", {}).get("webLocation", {}).get("url")
-                or ""
-            )
-            frag = ref.get("content", {}).get("text", "")
-            if uri:
-                cites.append({"uri": uri, "snippet": frag[:600]})
-    return cites[:8]
+            cite = _ref_to_cite(ref)
+            if cite:
+                yield cite
+
+def _extract_citations(rag_response: Dict[str, Any]) -> List[Dict[str, str]]:
+    # islice останавливает обход, как только набрано MAX_CITATIONS
+    return list(itertools.islice(_iter_refs(rag_response), MAX_CITATIONS))
 
 # ---------- Persona helpers ----------
 def _persona_temperature(base: float, persona: str) -> float:
@@ -184,38 +269,240 @@ def _persona_temperature(base: float, persona: str) -> float:
 
 def _persona_or_default(p: str) -> str:
     p = (p or "").lower().strip()
-    if p in ("friendly", "formal", "humorous"):
+    if p in PERSONAS:
         return p
     return "friendly"
 
-# ---------- Bedrock KB RAG (на русском) ----------
-def _retrieve_and_generate_ru(query: str, persona: str, temperature: float) -> Dict[str, Any]:
-    prompt_text = PROMPT_RU_TEMPLATE.format(persona=persona)
-    req = {
+# ---------- Bedrock KB RAG ----------
+def _build_rag_request(query: str, lang: str, persona: str, temperature: float) -> Dict[str, Any]:
+    prompt_text = PROMPT_BY_LANG_PERSONA[(lang, persona)]
+    generation_cfg: Dict[str, Any] = {
+        "promptTemplate": {"textPromptTemplate": prompt_text},
+        "inferenceConfig": {
+            "textInferenceConfig": {
+                "maxTokens": int(MAX_TOKENS),
+                "temperature": float(temperature),
+                "topP": 0.9,
+            }
+        },
+    }
+    if LATENCY_MODE == "optimized":
+        generation_cfg["performanceConfig"] = {"latency": "optimized"}
+    return {
         "input": {"text": query},
         "retrieveAndGenerateConfiguration": {
             "type": "KNOWLEDGE_BASE",
             "knowledgeBaseConfiguration": {
                 "knowledgeBaseId": KB_ID,
-                "modelArn": FOUNDATION_MODEL_ARN,
+                "modelArn": GENERATION_MODEL_ARN,
                 "retrievalConfiguration": {
                     "vectorSearchConfiguration": {"numberOfResults": int(TOP_K)}
                 },
-                "generationConfiguration": {
-                    "promptTemplate": {"textPromptTemplate": prompt_text},
-                    "inferenceConfig": {
-                        "textInferenceConfig": {
-                            "maxTokens": int(MAX_TOKENS),
-                            "temperature": float(temperature),
-                            "topP": 0.9,
-                        }
-                    },
-                },
+                "generationConfiguration": generation_cfg,
             }
         }
     }
+
+# Начало хвостовой секции (Note:/Output:) и текст после двоеточия в той же строке
+STREAM_SECTION_RE = re.compile(
+    r"(?:^|\n)\s*\*{0,2}\s*(?:output|note)\s*:[ \t]*(?P<rest>[^\n]*)", re.IGNORECASE
+)
+
+def _stream_done(buf: str) -> bool:
+    """
+    Эвристика «ответ уже закончен». Останавливаемся, только если до маркера есть
+    непустой ответ и маркер не открывает <out>-блок (случай "Output:\n<out>…</out>"
+    _final_sanitize оставляет — его дочитываем до </out>).
+    """
+    low = buf.lower()
+    if "<out>" in low:
+        return OUT_TAG_RE.search(buf) is not None
+    end = low.find("</out>")
+    if end != -1:
+        return bool(_final_sanitize(buf[:end]))
+    m = STREAM_SECTION_RE.search(buf)
+    if not m:
+        return False
+    rest = m.group("rest").strip()
+    if not rest or rest.startswith("<"):
+        return False  # строка маркера ещё не дописана или дальше идёт тег
+    return bool(_final_sanitize(buf[:m.start()]))
+
+def _retrieve_and_generate_stream(req: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Читает поток и прекращает его, как только _stream_done считает ответ законченным,
+    не дожидаясь хвоста генерации. Форма результата — как у retrieve_and_generate, но это
+    приближение: citation-события, пришедшие после остановки, теряются, а <out>-блок,
+    который модель открыла бы уже после Note:/Output:, не будет прочитан.
+    Поэтому режим опциональный (BEDROCK_STREAM=1).
+    """
+    stream = bedrock_agent_rt.retrieve_and_generate_stream(**req)["stream"]
+    text = ""
+    citations: List[Dict[str, Any]] = []
+    try:
+        for event in stream:
+            if "citation" in event:
+                citations.append(event["citation"])
+            elif "output" in event:
+                text += event["output"].get("text", "")
+                if _stream_done(text):
+                    break
+    finally:
+        stream.close()
+    return {"output": {"text": text}, "citations": citations}
+
+def _retrieve_and_generate(query: str, lang: str, persona: str, temperature: float) -> Dict[str, Any]:
+    req = _build_rag_request(query, lang, persona, temperature)
+    if STREAM:
+        return _retrieve_and_generate_stream(req)
     return bedrock_agent_rt.retrieve_and_generate(**req)
 
+# ---------- Response cache ----------
+# Tier 1: exact match on sha1(persona|lang|normalized text) — in-memory LRU + optional DynamoDB.
+# Tier 2: semantic match on Titan embeddings (cosine >= CACHE_SIM_THRESHOLD), in-memory per container.
+# Кэш best-effort: сбой DynamoDB/Titan (в т.ч. таймауты — BotoCoreError) или битая запись = промах
+CACHE_ERRORS = (ClientError, BotoCoreError, KeyError, TypeError, ValueError)
+
+_exact_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_semantic_cache: "OrderedDict[str, Tuple[str, List[float], float, Dict[str, Any]]]" = OrderedDict()
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+def _cache_key(persona: str, lang: str, text: str) -> str:
+    return hashlib.sha1(f"{persona}|{lang}|{_normalize_query(text)}".encode("utf-8")).hexdigest()
+
+def _lru_put(cache: OrderedDict, key: str, value: Any) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max(1, CACHE_MAX_ITEMS):
+        cache.popitem(last=False)
+
+def _cache_get_exact(key: str) -> Optional[Dict[str, Any]]:
+    now = time.time()
+    hit = _exact_cache.get(key)
+    if hit:
+        if hit[0] > now:
+            _exact_cache.move_to_end(key)
+            return hit[1]
+        _exact_cache.pop(key, None)
+    if dynamodb is None:
+        return None
+    try:
+        item = dynamodb.get_item(
+            TableName=CACHE_TABLE,
+            Key={"cache_key": {"S": key}},
+        ).get("Item")
+        # TTL-удаление в DynamoDB ленивое, поэтому срок проверяем сами
+        if not item:
+            return None
+        expires_at = float(item["expires_at"]["N"])
+        if expires_at <= now:
+            return None
+        payload = json.loads(item["payload"]["S"])
+        if not isinstance(payload, dict):
+            raise ValueError("cached payload is not an object")
+    except CACHE_ERRORS as e:
+        print(f"WARN cache get failed: {e!r}")
+        return None
+    _lru_put(_exact_cache, key, (expires_at, payload))
+    return payload
+
+def _embed(text: str) -> Optional[List[float]]:
+    if bedrock_rt is None:
+        return None
+    try:
+        resp = bedrock_rt.invoke_model(
+            modelId=EMBED_MODEL_ID,
+            body=json.dumps({"inputText": _normalize_query(text), "dimensions": 256, "normalize": True}),
+            contentType="application/json",
+            accept="application/json",
+        )
+        vec = [float(x) for x in json.loads(resp["body"].read()).get("embedding") or []]
+    except CACHE_ERRORS as e:
+        print(f"WARN embedding failed: {e!r}")
+        return None
+    norm = math.sqrt(sum(x * x for x in vec))
+    return [x / norm for x in vec] if norm else None
+
+def _cache_get_semantic(scope: str, vec: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+    if not vec:
+        return None
+    now = time.time()
+    best_key, best_sim = None, CACHE_SIM_THRESHOLD
+    for key, (entry_scope, entry_vec, expires_at, _) in list(_semantic_cache.items()):
+        if expires_at <= now:
+            _semantic_cache.pop(key, None)
+            continue
+        if entry_scope != scope or len(entry_vec) != len(vec):
+            continue
+        sim = sum(a * b for a, b in zip(vec, entry_vec))
+        if sim >= best_sim:
+            best_key, best_sim = key, sim
+    if best_key is None:
+        return None
+    _semantic_cache.move_to_end(best_key)
+    return _semantic_cache[best_key][3]
+
+def _cache_put(key: str, scope: str, vec: Optional[List[float]], payload: Dict[str, Any]) -> None:
+    expires_at = time.time() + CACHE_TTL_SEC
+    _lru_put(_exact_cache, key, (expires_at, payload))
+    if vec:
+        _lru_put(_semantic_cache, key, (scope, vec, expires_at, payload))
+    if dynamodb is None:
+        return
+    try:
+        dynamodb.put_item(
+            TableName=CACHE_TABLE,
+            Item={
+                "cache_key": {"S": key},
+                "payload": {"S": json.dumps(payload, ensure_ascii=False)},
+                "expires_at": {"N": str(int(expires_at))},
+            },
+        )
+    except CACHE_ERRORS as e:
+        print(f"WARN cache put failed: {e!r}")
+
+# ---------- Language ----------
+CYRILLIC_RE = re.compile(r"[А-Яа-яЁёӘәҒғҚқҢңӨөҰұҮүҺһІі]")
+KAZAKH_ONLY_RE = re.compile(r"[ӘәҒғҚқҢңӨөҰұҮүҺһІі]")
+WORD_RE = re.compile(r"[^\W\d_]+")
+# Служебные слова: казахские топонимы (Бәйтерек, Нұр Әлем) встречаются и в русском ответе,
+# поэтому одних казахских букв мало — смотрим, на каком языке «связки» между ними
+RU_FUNCTION_WORDS = frozenset((
+    "и", "в", "на", "не", "что", "это", "для", "по", "с", "из", "или", "есть", "как",
+    "от", "до", "к", "у", "о", "при", "но", "так", "же", "можно", "также", "нет",
+))
+KK_FUNCTION_WORDS = frozenset((
+    "және", "мен", "үшін", "бұл", "бар", "жоқ", "болады", "туралы", "арқылы", "немесе",
+    "деректер", "дерек", "қорытынды", "бойынша", "бірақ", "сондай",
+))
+
+def _target_lang(lang: str) -> str:
+    if lang.startswith("kk"):
+        return "kk"
+    if lang.startswith("en"):
+        return "en"
+    return "ru"
+
+def _looks_like_lang(text: str, lang: str) -> bool:
+    """Грубая проверка, что модель ответила на нужном языке (иначе — fallback на Translate)."""
+    if not text or lang == "ru":
+        return True
+    if lang == "kk":
+        cyrillic = len(CYRILLIC_RE.findall(text))
+        if not cyrillic:
+            return False
+        share = len(KAZAKH_ONLY_RE.findall(text)) / cyrillic
+        words = [w.lower() for w in WORD_RE.findall(text)]
+        ru_words = sum(1 for w in words if w in RU_FUNCTION_WORDS)
+        kk_words = sum(1 for w in words if w in KK_FUNCTION_WORDS)
+        if ru_words > kk_words:
+            return False
+        return share >= 0.05 or (kk_words > 0 and share >= 0.02)
+    letters = sum(1 for ch in text if ch.isalpha())
+    return len(CYRILLIC_RE.findall(text)) <= 0.2 * letters
+
 # ---------- Translation ----------
 def _translate_from_ru(text: str, target_lang: str) -> str:
     tl = target_lang.lower()
@@ -251,7 +538,7 @@ def _resp(status: int, payload: Dict[str, Any]) -> Dict[str, Any]:
             "access-control-allow-methods": "POST, OPTIONS",
             "access-control-max-age": "3600",
         },
-        "body": json.dumps(payload, ensure_ascii=False),
+        "body": orjson.dumps(payload).decode() if orjson else json.dumps(payload, ensure_ascii=False),
     }
 
 # ---------- Handler ----------
@@ -266,26 +553,54 @@ def lambda_handler(event, context):
         if not text:
             return _resp(400, {"error": "bad_request", "detail": "Missing 'text' in request body"})
 
+        cache_scope = f"{persona_in}|{lang}"
+        cache_key = _cache_key(persona_in, lang, text)
+        query_vec = None
+        cached = _cache_get_exact(cache_key)
+        if cached is None and EMBED_MODEL_ID:
+            query_vec = _embed(text)
+            cached = _cache_get_semantic(cache_scope, query_vec)
+        if cached is not None:
+            return _resp(200, {
+                "lang": lang,
+                "persona": persona_in,
+                **cached,
+                "cache_hit": True,
+                "latency_ms": int((time.time() - t0) * 1000),
+                "request_id": getattr(context, "aws_request_id", None),
+            })
+
         temp_used = _persona_temperature(BASE_TEMP, persona_in)
 
-        rag = _retrieve_and_generate_ru(text, persona_in, temp_used)
-        raw_answer_ru = rag.get("output", {}).get("text", "") or ""
-        cleaned_ru = _final_sanitize(raw_answer_ru)
+        target = _target_lang(lang)
+        gen_lang = target if target in GENERATE_LANGS else "ru"
 
-        if lang.startswith("kk") or lang.startswith("en"):
-            final_answer = _translate_from_ru(cleaned_ru, lang)
-        else:
-            final_answer = cleaned_ru
+        rag = _retrieve_and_generate(text, gen_lang, persona_in, temp_used)
+        raw_answer = rag.get("output", {}).get("text", "") or ""
+        cleaned = _final_sanitize(raw_answer)
 
-        citations = _extract_citations(rag)
+        # Translate только если язык генерации не совпал или модель ответила не на том языке
+        if target != "ru" and not (gen_lang == target and _looks_like_lang(cleaned, target)):
+            translated = _executor.submit(_translate_from_ru, cleaned, lang)
+            citations = _extract_citations(rag)
+            final_answer = translated.result()
+        else:
+            final_answer = cleaned
+            citations = _extract_citations(rag)
+        result = {
+            "temperature_used": round(temp_used, 3),
+            "answer": final_answer,
+            "citations": citations,
+        }
+        if final_answer:
+            _cache_put(cache_key, cache_scope, query_vec, result)
         latency_ms = int((time.time() - t0) * 1000)
 
         return _resp(200, {
             "lang": lang,
             "persona": persona_in,
-            "temperature_used": round(temp_used, 3),
-            "answer": final_answer,
-            "citations": citations,
+            **result,
+            "cache_hit": False,
             "latency_ms": latency_ms,
             "request_id": getattr(context, "aws_request_id", None),
         })
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+os.environ.setdefault("KNOWLEDGE_BASE_ID", "test-kb")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from lambda_function import _looks_like_lang  # noqa: E402
+
+RU_WITH_KK_NAMES = (
+    "Лид: Монумент Бәйтерек в Астане. Факты: Бәйтерек — символ столицы, высота 97 м. "
+    "Нұр Әлем — музей будущей энергии, работает с 10:00. Жеңіс Паркі — парк для прогулок. "
+    "Итог: позвоните для уточнения."
+)
+KK_ANSWER = (
+    "Лид: Астанадағы Бәйтерек монументі. Деректер: Бәйтерек — астананың символы, биіктігі 97 м. "
+    "Нұр Әлем — болашақ энергиясы мұражайы, 10:00-ден бастап жұмыс істейді. "
+    "Қорытынды: толығырақ телефон арқылы біліңіз."
+)
+
+
+def test_russian_with_kazakh_place_names_is_not_kazakh():
+    assert not _looks_like_lang(RU_WITH_KK_NAMES, "kk")
+    assert not _looks_like_lang("Лид: Бәйтерек — смотровая площадка.", "kk")
+
+
+def test_kazakh_answer_is_kazakh():
+    assert _looks_like_lang(KK_ANSWER, "kk")
+    assert _looks_like_lang("Астанадағы базарлар туралы деректер жоқ.", "kk")
+
+
+def test_english_check():
+    assert _looks_like_lang("Lead: Baiterek monument. Facts: height 97 m.", "en")
+    assert not _looks_like_lang(RU_WITH_KK_NAMES, "en")
@@ -0,0 +1,165 @@
+"""
+Офлайн-классификация через Bedrock Batch Inference (~50% стоимости on-demand).
+Для переиндексации каталога и прогонов на eval-наборах — не для пользовательских запросов.
+
+  # 1) собрать input.jsonl из манифеста и запустить job
+  python batch_classify.py submit \\
+      --manifest s3://bucket/eval/images.txt \\
+      --input-uri s3://bucket/batch/input.jsonl \\
+      --output-uri s3://bucket/batch/output/ \\
+      --role-arn arn:aws:iam::<acct>:role/BedrockBatchRole
+
+  # 2) после завершения job — разобрать результаты
+  python batch_classify.py collect \\
+      --manifest s3://bucket/eval/images.txt \\
+      --output-uri s3://bucket/batch/output/<job-id>/
+
+Манифест — текстовый файл в S3, по одному s3://bucket/key изображения на строку.
+recordId = номер строки манифеста (11 цифр). Bedrock требует минимум 100 записей на job.
+Env: BEDROCK_REGION, MODEL_ID / INFERENCE_PROFILE_ARN, LANDMARKS_JSON — как у Lambda.
+Список достопримечательностей удобнее передать файлом: --landmarks-file landmarks.json
+(JSON из .env.example через `export $(cat ... | xargs)` не загрузить — shell съедает кавычки).
+"""
+import argparse, base64, json, os, sys, time
+
+import boto3
+
+# lambda_function читает LANDMARKS_JSON при импорте — файл подставляем до импорта
+_pre = argparse.ArgumentParser(add_help=False)
+_pre.add_argument("--landmarks-file")
+_landmarks_file = _pre.parse_known_args()[0].landmarks_file
+if _landmarks_file:
+    with open(_landmarks_file, encoding="utf-8") as f:
+        os.environ["LANDMARKS_JSON"] = json.dumps(json.load(f), ensure_ascii=False)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from lambda_function import (  # noqa: E402
+    LANDMARKS, KNOWN_IDS, INVOKE_MODEL_ID, BEDROCK_REGION, BOTO_CONFIG,
+    build_messages, downscale_image, parse_detection, localized_name,
+)
+
+EXT_FORMAT = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png"}
+MIME_FORMAT = {"image/jpeg": "jpeg", "image/png": "png"}
+
+
+def split_s3(uri: str) -> tuple:
+    if not uri.startswith("s3://"):
+        raise ValueError(f"not an s3 uri: {uri}")
+    bucket, _, key = uri[5:].partition("/")
+    return bucket, key
+
+
+def read_manifest(s3, uri: str) -> list:
+    bucket, key = split_s3(uri)
+    text = s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def to_llama_native(messages: list) -> dict:
+    """
+    Converse-сообщения → нативное тело InvokeModel для Llama 3.2 Vision.
+    Batch Inference принимает только нативный формат модели, а bytes в JSON не кладутся.
+    """
+    prompt = "<|begin_of_text|>"
+    images = []
+    for msg in messages:
+        prompt += f"<|start_header_id|>{msg['role']}<|end_header_id|>\n\n"
+        for block in msg["content"]:
+            if "image" in block:
+                prompt += "<|image|>"
+                images.append(base64.b64encode(block["image"]["source"]["bytes"]).decode("ascii"))
+        prompt += "".join(block["text"] for block in msg["content"] if "text" in block)
+        prompt += "<|eot_id|>"
+    prompt += "<|start_header_id|>assistant<|end_header_id|>\n\n"
+    return {"prompt": prompt, "images": images, "max_gen_len": 150, "temperature": 0}
+
+
+def cmd_submit(args):
+    s3 = boto3.client("s3", region_name=BEDROCK_REGION, config=BOTO_CONFIG)
+    images = read_manifest(s3, args.manifest)
+    if not LANDMARKS:
+        sys.exit("LANDMARKS_JSON is empty")
+
+    lines = []
+    for i, uri in enumerate(images):
+        bucket, key = split_s3(uri)
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        fmt = MIME_FORMAT.get(obj.get("ContentType", "")) or EXT_FORMAT.get(os.path.splitext(key)[1].lower())
+        if not fmt:
+            print(f"skip {uri}: unsupported type", file=sys.stderr)
+            continue
+        img_bytes, fmt = downscale_image(obj["Body"].read(), fmt)
+        record = {
+            "recordId": f"{i:011d}",
+            "modelInput": to_llama_native(build_messages(img_bytes, fmt, LANDMARKS)),
+        }
+        lines.append(json.dumps(record, ensure_ascii=False))
+
+    bucket, key = split_s3(args.input_uri)
+    s3.put_object(Bucket=bucket, Key=key, Body=("\n".join(lines) + "\n").encode("utf-8"))
+    print(f"wrote {len(lines)} records to {args.input_uri}", file=sys.stderr)
+
+    bedrock = boto3.client("bedrock", region_name=BEDROCK_REGION, config=BOTO_CONFIG)
+    job = bedrock.create_model_invocation_job(
+        jobName=args.job_name or f"landmarks-{int(time.time())}",
+        roleArn=args.role_arn,
+        modelId=args.model_id or INVOKE_MODEL_ID,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": args.input_uri}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": args.output_uri}},
+    )
+    print(json.dumps({"jobArn": job["jobArn"]}))
+
+
+def cmd_collect(args):
+    s3 = boto3.client("s3", region_name=BEDROCK_REGION, config=BOTO_CONFIG)
+    images = read_manifest(s3, args.manifest)
+    bucket, prefix = split_s3(args.output_uri)
+
+    pages = s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix)
+    for page in pages:
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith(".jsonl.out"):
+                continue
+            body = s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"]
+            for raw in body.iter_lines():
+                if not raw:
+                    continue
+                rec = json.loads(raw)
+                idx = int(rec["recordId"])
+                text_out = (rec.get("modelOutput") or {}).get("generation", "")
+                det = parse_detection(text_out, KNOWN_IDS)
+                print(json.dumps({
+                    "image": images[idx] if idx < len(images) else None,
+                    "id": det["id"] if det else None,
+                    "name": localized_name(det["id"], args.lang) if det else None,
+                    "confidence": det["confidence"] if det else None,
+                    "error": rec.get("error"),
+                }, ensure_ascii=False))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--landmarks-file", help="JSON array of landmarks (overrides LANDMARKS_JSON)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("submit", help="build input.jsonl and start a batch job")
+    p.add_argument("--manifest", required=True)
+    p.add_argument("--input-uri", required=True)
+    p.add_argument("--output-uri", required=True)
+    p.add_argument("--role-arn", required=True)
+    p.add_argument("--model-id", default=None)
+    p.add_argument("--job-name", default=None)
+    p.set_defaults(func=cmd_submit)
+
+    p = sub.add_parser("collect", help="parse job output into detections (JSON lines)")
+    p.add_argument("--manifest", required=True)
+    p.add_argument("--output-uri", required=True)
+    p.add_argument("--lang", default="ru")
+    p.set_defaults(func=cmd_collect)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
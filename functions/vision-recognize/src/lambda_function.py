@@ -1,15 +1,69 @@
-import os, json, base64, time, uuid, re, sys
+import os, json, binascii, time, uuid, re, sys
+from io import BytesIO
 import boto3
+from botocore.config import Config
+
+try:
+    import orjson
+except ImportError:  # локально без слоя с orjson
+    orjson = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow отправляем изображение как есть
+    Image = None
 
 # ---- Константы ----
 ALLOWED_MIME = {b"image/jpeg": "jpeg", b"image/png": "png"}
 MAX_BYTES = 5 * 1024 * 1024
+MAX_MULTIPART_OVERHEAD = 16 * 1024  # заголовки частей + поля lang/persona
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_NAME_RE     = re.compile(r'name="([^"]+)"', re.IGNORECASE)
+_FILENAME_RE = re.compile(r'filename="([^"]+)"', re.IGNORECASE)
+_JSON_DET_RE = re.compile(r'\{[^{}]*"id"\s*:\s*"([^"]+)"[^{}]*"confidence"\s*:\s*([0-9.]+)[^{}]*\}')
 
 # ---- ENV ----
 BEDROCK_REGION = os.getenv("BEDROCK_REGION", "us-east-1")
 MODEL_ID       = os.getenv("MODEL_ID", "meta.llama3-2-90b-instruct-v1:0")
+# ARN cross-region inference profile, если задан, имеет приоритет над MODEL_ID
+INVOKE_MODEL_ID = (os.getenv("INFERENCE_PROFILE_ARN", "") or "").strip() or MODEL_ID
 LANDMARKS      = json.loads(os.getenv("LANDMARKS_JSON", "[]"))
 DRY_RUN        = os.getenv("DRY_RUN", "0") == "1"
+LATENCY_MODE   = (os.getenv("BEDROCK_LATENCY", "standard") or "standard").strip().lower()
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+STREAM         = os.getenv("BEDROCK_STREAM", "1") == "1"
+
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+    connect_timeout=3,
+    read_timeout=30,
+)
+
+# ---- Индексы LANDMARKS (строятся один раз на контейнер) ----
+def build_instruction(landmarks: list) -> str:
+    lines = []
+    for lm in landmarks:
+        if "id" not in lm:
+            continue
+        name_en = lm.get("name_en", lm["id"])
+        hint = lm.get("hint_en") or ""
+        lines.append(f'- {name_en} (id: {lm["id"]}){" - " + hint if hint else ""}')
+
+    return (
+        "You are an extremely strict image classifier for landmarks in Astana, Kazakhstan.\n"
+        "Choose ONE best match from the list or return id=\"none\" if no match.\n"
+        "Return ONLY compact JSON: {\"id\":\"...\",\"confidence\":0..1}.\n"
+        "Candidates:\n" + "\n".join(lines)
+    )
+
+LANDMARKS_BY_ID = {}
+for _lm in LANDMARKS:
+    if "id" in _lm:
+        LANDMARKS_BY_ID.setdefault(_lm["id"], _lm)
+KNOWN_IDS = frozenset(LANDMARKS_BY_ID)
+INSTRUCTION = build_instruction(LANDMARKS)
 
 # Ленивая и безопасная инициализация клиента
 _bedrock = None
@@ -17,7 +71,7 @@ def bedrock_client():
     global _bedrock
     if _bedrock is None:
         region = (os.getenv("BEDROCK_REGION", "us-east-1") or "us-east-1").strip().replace(" ", "")
-        _bedrock = boto3.client("bedrock-runtime", region_name=region)
+        _bedrock = boto3.client("bedrock-runtime", region_name=region, config=BOTO_CONFIG)
     return _bedrock
 
 # ---- Lambda entrypoint ----
@@ -35,13 +89,18 @@ def lambda_handler(event, context):
         if not content_type or "multipart/form-data" not in content_type:
             return _resp(400, {"message": "Expected multipart/form-data", "request_id": request_id})
 
-        body_bytes = base64.b64decode(event["body"])
+        # Оценка размера до декодирования: base64 раздувает данные в 4/3 раза
+        body_b64 = event["body"]
+        if (len(body_b64) * 3) // 4 > MAX_BYTES + MAX_MULTIPART_OVERHEAD:
+            return _resp(413, {"message": "File too large", "request_id": request_id})
+
+        body_bytes = binascii.a2b_base64(body_b64)
         fields = parse_multipart(body_bytes, content_type)
 
         lang = (fields.get("lang") or "ru").lower()
         persona = (fields.get("persona") or "formal").lower()
         file = fields.get("file")
-        if not file:
+        if not file or not file["content"]:  # пустая file-часть — то же, что её отсутствие
             return _resp(400, {"message": "file is required", "request_id": request_id})
 
         mime = file["content_type"]
@@ -52,14 +111,15 @@ def lambda_handler(event, context):
             return _resp(415, {"message": "Unsupported media type", "request_id": request_id})
 
         # Отладка окружения
-        print(f"DBG landmarks={len(LANDMARKS)} region={BEDROCK_REGION} model={MODEL_ID} dry_run={DRY_RUN}", file=sys.stderr)
+        print(f"DBG landmarks={len(LANDMARKS)} region={BEDROCK_REGION} model={INVOKE_MODEL_ID} dry_run={DRY_RUN}", file=sys.stderr)
 
         # ---- Классификация ----
         if DRY_RUN:
             det = {"id": LANDMARKS[0]["id"], "confidence": 0.92} if LANDMARKS else None
         else:
             try:
-                det = classify_with_llama(img_bytes, ALLOWED_MIME[mime], LANDMARKS)
+                img_bytes, img_format = downscale_image(img_bytes, ALLOWED_MIME[mime])
+                det = classify_with_llama(img_bytes, img_format, LANDMARKS)
             except Exception as e:
                 print("ERROR classify_with_llama:", repr(e), file=sys.stderr)
                 det = None
@@ -101,55 +161,84 @@ def _resp(code: int, obj: dict):
             "Access-Control-Allow-Methods": "POST,OPTIONS",
             "Access-Control-Allow-Headers": "Content-Type,X-Requested-With,Accept,Origin,x-api-key"
         },
-        "body": json.dumps(obj, ensure_ascii=False)
+        "body": orjson.dumps(obj).decode() if orjson else json.dumps(obj, ensure_ascii=False)
     }
 
 def localized_name(landmark_id: str, lang: str) -> str:
-    for lm in LANDMARKS:
-        if lm.get("id") == landmark_id:
-            return lm.get(f"name_{lang}", lm.get("name_ru", landmark_id))
-    return landmark_id
+    lm = LANDMARKS_BY_ID.get(landmark_id)
+    if lm is None:
+        return landmark_id
+    return lm.get(f"name_{lang}", lm.get("name_ru", landmark_id))
+
+_NO_OBJECT = {
+    "ru": "Не удалось распознать достопримечательность.",
+    "kk": "Нысанды тану мүмкін болмады.",
+    "en": "Could not recognize the landmark."
+}
+_TRY_CLOSER = {
+    "ru": "Попробуйте сфотографировать ближе.",
+    "kk": "Жақынырақ түсіріп көріңіз.",
+    "en": "Try taking a closer photo."
+}
+_SUCCESS = {
+    "ru": "Супер! Это {name} — квест засчитан!",
+    "kk": "Супер! Бұл {name} – квест тапсырмасы орындалды!",
+    "en": "Great! That’s {name} — quest checkpoint completed!"
+}
 
 def msg_no_object(lang: str) -> str:
-    return {
-        "ru": "Не удалось распознать достопримечательность.",
-        "kk": "Нысанды тану мүмкін болмады.",
-        "en": "Could not recognize the landmark."
-    }.get(lang, "Не удалось распознать достопримечательность.")
+    return _NO_OBJECT.get(lang, _NO_OBJECT["ru"])
 
 def msg_try_closer(lang: str) -> str:
-    return {
-        "ru": "Попробуйте сфотографировать ближе.",
-        "kk": "Жақынырақ түсіріп көріңіз.",
-        "en": "Try taking a closer photo."
-    }.get(lang, "Попробуйте сфотографировать ближе.")
+    return _TRY_CLOSER.get(lang, _TRY_CLOSER["ru"])
 
 def msg_success(name: str, lang: str, persona: str) -> str:
-    if lang == "kk":
-        return f"Супер! Бұл {name} – квест тапсырмасы орындалды!"
-    if lang == "en":
-        return f"Great! That’s {name} — quest checkpoint completed!"
-    return f"Супер! Это {name} — квест засчитан!"
-
-def classify_with_llama(image_bytes: bytes, img_format: str, landmarks: list) -> dict | None:
-    if not landmarks:
-        print("DBG no landmarks → skip model", file=sys.stderr)
-        return None
+    return _SUCCESS.get(lang, _SUCCESS["ru"]).format(name=name)
 
-    lines = []
-    for lm in landmarks:
-        name_en = lm.get("name_en", lm["id"])
-        hint = lm.get("hint_en") or ""
-        lines.append(f'- {name_en} (id: {lm["id"]}){" - " + hint if hint else ""}')
-
-    instruction = (
-        "You are an extremely strict image classifier for landmarks in Astana, Kazakhstan.\n"
-        "Choose ONE best match from the list or return id=\"none\" if no match.\n"
-        "Return ONLY compact JSON: {\"id\":\"...\",\"confidence\":0..1}.\n"
-        "Candidates:\n" + "\n".join(lines)
-    )
-
-    messages = [{
+def downscale_image(image_bytes: bytes, img_format: str) -> tuple:
+    """
+    Уменьшает изображение до IMAGE_MAX_EDGE по длинной стороне и пережимает в JPEG q=85.
+    Модель всё равно даунсемплит картинку — нет смысла слать в Bedrock мегабайты.
+    Прозрачность (RGBA/LA/P) заливается белым — JPEG альфу не хранит.
+    Возвращает исходные байты при любой ошибке, без Pillow и если пережатый JPEG не меньше исходника.
+    """
+    if Image is None or IMAGE_MAX_EDGE <= 0:
+        return image_bytes, img_format
+    try:
+        im = Image.open(BytesIO(image_bytes))
+        if max(im.size) <= IMAGE_MAX_EDGE:
+            return image_bytes, img_format
+        im.draft("RGB", (IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))  # JPEG: масштабирование прямо в декодере
+        im = ImageOps.exif_transpose(im)  # EXIF при пережатии теряется — поворачиваем заранее
+        im.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+        if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+            im = im.convert("RGBA")
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        elif im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        buf = BytesIO()
+        im.save(buf, "JPEG", quality=85, optimize=True)
+    except Exception as e:
+        print("DBG downscale skipped:", repr(e), file=sys.stderr)
+        return image_bytes, img_format
+    if buf.tell() >= len(image_bytes):
+        print(f"DBG downscale kept original ({len(image_bytes)} <= {buf.tell()} bytes)", file=sys.stderr)
+        return image_bytes, img_format
+    print(f"DBG downscale {len(image_bytes)} -> {buf.tell()} bytes", file=sys.stderr)
+    return buf.getvalue(), "jpeg"
+
+def _instruction_and_ids(landmarks: list) -> tuple:
+    # LANDMARKS фиксированы на время жизни контейнера — инструкцию и id берём готовыми
+    if landmarks is LANDMARKS:
+        return INSTRUCTION, KNOWN_IDS
+    return build_instruction(landmarks), frozenset(lm["id"] for lm in landmarks if "id" in lm)
+
+def build_messages(image_bytes: bytes, img_format: str, landmarks: list) -> list:
+    """Converse-сообщения для классификации (общие для онлайн-вызова и batch-скрипта)."""
+    instruction, _ = _instruction_and_ids(landmarks)
+    return [{
         "role": "user",
         "content": [
             {"text": instruction},
@@ -157,19 +246,9 @@ def classify_with_llama(image_bytes: bytes, img_format: str, landmarks: list) ->
         ]
     }]
 
-    bedrock = bedrock_client()
-    resp = bedrock.converse(
-        modelId=MODEL_ID,
-        messages=messages,
-        inferenceConfig={"maxTokens": 150, "temperature": 0}
-    )
-
-    text_out = ""
-    for b in resp["output"]["message"]["content"]:
-        if "text" in b:
-            text_out += b["text"]
-
-    m = re.search(r'\{[^{}]*"id"\s*:\s*"([^"]+)"[^{}]*"confidence"\s*:\s*([0-9.]+)[^{}]*\}', text_out)
+def parse_detection(text_out: str, known_ids) -> dict | None:
+    """Достаёт {"id","confidence"} из ответа модели; неизвестные id → None."""
+    m = _JSON_DET_RE.search(text_out)
     if not m:
         return None
     det_id = m.group(1).strip()
@@ -177,7 +256,6 @@ def classify_with_llama(image_bytes: bytes, img_format: str, landmarks: list) ->
     if det_id.lower() == "none":
         return None
 
-    known_ids = {lm["id"] for lm in landmarks if "id" in lm}
     if det_id not in known_ids:
         det_low = det_id.lower()
         for kid in known_ids:
@@ -188,31 +266,81 @@ def classify_with_llama(image_bytes: bytes, img_format: str, landmarks: list) ->
             return None
     return {"id": det_id, "confidence": conf}
 
+def classify_with_llama(image_bytes: bytes, img_format: str, landmarks: list) -> dict | None:
+    if not landmarks:
+        print("DBG no landmarks → skip model", file=sys.stderr)
+        return None
+
+    messages = build_messages(image_bytes, img_format, landmarks)
+
+    kwargs = {}
+    if LATENCY_MODE == "optimized":
+        kwargs["performanceConfig"] = {"latency": "optimized"}
+
+    bedrock = bedrock_client()
+    if STREAM:
+        # Читаем поток только до первого полного JSON с детекцией — хвост генерации не ждём
+        resp = bedrock.converse_stream(
+            modelId=INVOKE_MODEL_ID,
+            messages=messages,
+            inferenceConfig={"maxTokens": 150, "temperature": 0},
+            **kwargs
+        )
+        stream = resp["stream"]
+        text_out = ""
+        try:
+            for event in stream:
+                delta = event.get("contentBlockDelta", {}).get("delta", {})
+                if "text" in delta:
+                    text_out += delta["text"]
+                    if "}" in delta["text"] and _JSON_DET_RE.search(text_out):
+                        break
+        finally:
+            stream.close()
+    else:
+        resp = bedrock.converse(
+            modelId=INVOKE_MODEL_ID,
+            messages=messages,
+            inferenceConfig={"maxTokens": 150, "temperature": 0},
+            **kwargs
+        )
+        text_out = ""
+        for b in resp["output"]["message"]["content"]:
+            if "text" in b:
+                text_out += b["text"]
+
+    return parse_detection(text_out, _instruction_and_ids(landmarks)[1])
+
 def parse_multipart(body: bytes, content_type: str) -> dict:
     """
     Разбор multipart/form-data. Возвращает:
       {"file":{"filename":..., "content_type": b"image/jpeg", "content": b"..."},
        "lang":"ru","persona":"formal"}
     """
-    m = re.search(r'boundary="?([^";]+)"?', content_type, re.IGNORECASE)
+    m = _BOUNDARY_RE.search(content_type)
     if not m:
         raise ValueError("boundary not found")
     boundary = m.group(1).encode()
     delimiter = b"--" + boundary
-    end_delimiter = b"--" + boundary + b"--"
 
+    # Идём по телу через find(): части не копируются, байты файла берутся одним срезом
+    mv = memoryview(body)
     out = {}
-    chunks = body.split(delimiter)
-    for ch in chunks:
-        ch = ch.strip()
-        if not ch or ch == b"--" or ch == end_delimiter:
-            continue
-
-        h_end = ch.find(b"\r\n\r\n")
+    pos = body.find(delimiter)
+    while pos != -1:
+        start = pos + len(delimiter)
+        if body.startswith(b"--", start):  # закрывающий --boundary--
+            break
+        pos = body.find(delimiter, start)
+        end = pos if pos != -1 else len(body)
+
+        h_end = body.find(b"\r\n\r\n", start, end)
         if h_end == -1:
             continue
-        raw_headers = ch[:h_end].decode("utf-8", "ignore")
-        data = ch[h_end + 4:].rstrip(b"\r\n")
+        raw_headers = bytes(mv[start:h_end]).decode("utf-8", "ignore").strip()
+        data_start = h_end + 4
+        data_end = end - 2 if body.startswith(b"\r\n", end - 2) else end  # CRLF перед разделителем
+        data_end = max(data_start, data_end)
 
         disp = None
         ctype = None
@@ -226,19 +354,19 @@ def parse_multipart(body: bytes, content_type: str) -> dict:
         if not disp:
             continue
 
-        name_m = re.search(r'name="([^"]+)"', disp, re.IGNORECASE)
+        name_m = _NAME_RE.search(disp)
         if not name_m:
             continue
         name = name_m.group(1)
 
-        file_m = re.search(r'filename="([^"]+)"', disp, re.IGNORECASE)
+        file_m = _FILENAME_RE.search(disp)
         if file_m:
             out["file"] = {
                 "filename": file_m.group(1),
                 "content_type": ctype or b"application/octet-stream",
-                "content": data
+                "content": bytes(mv[data_start:data_end])
             }
         else:
-            out[name] = data.decode("utf-8", "ignore")
+            out[name] = bytes(mv[data_start:data_end]).decode("utf-8", "ignore").strip()
 
     return out